@@ -0,0 +1,72 @@
+# Compare update dispatch through Router with the old one-handler-per-command registration.
+# Run with: python bench_router.py
+import timeit
+import telebot
+from telebot import types
+from router import Router
+
+COMMANDS = ["random_pack", "stats", "set_reply_chance", "get_reply_chance", "ban_pack", "unban_pack",
+            "list_packs", "clear_packs", "set_pack_limit", "get_pack_limit", "help", "top_users",
+            "slow_updates", "set_language"]
+MEDIA_TYPES = ["text", "photo", "video", "animation", "video_note"]
+NUMBER = 20000
+
+def noop(update):
+    """Handler that does nothing, so only dispatch is measured."""
+
+def make_message(text=None, sticker=False):
+    """Build a minimal Message as it arrives from getUpdates."""
+    data = {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": -100, "type": "supergroup"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+    }
+    if sticker:
+        data["sticker"] = {"file_id": "f", "file_unique_id": "u", "type": "regular", "width": 512,
+                           "height": 512, "is_animated": False, "is_video": False, "set_name": "pack"}
+    else:
+        data["text"] = text
+    return types.Message.de_json(data)
+
+def legacy_bot():
+    """Register handlers the way bot.py did before Router."""
+    bot = telebot.TeleBot("123:bench", threaded=False)
+    bot.message_handler(content_types=["sticker"])(noop)
+    for command in COMMANDS:
+        bot.message_handler(commands=[command])(noop)
+    bot.callback_query_handler(func=lambda call: True)(noop)
+    bot.message_handler(content_types=MEDIA_TYPES)(noop)
+    return bot
+
+def router_bot():
+    """Register the same routes through Router."""
+    bot = telebot.TeleBot("123:bench", threaded=False)
+    router = Router()
+    router.content_type(["sticker"], noop)
+    for command in COMMANDS:
+        router.command(command, noop)
+    router.callback("lang", noop)
+    router.callback(None, noop)
+    router.content_type(MEDIA_TYPES, noop)
+    router.register(bot)
+    return bot
+
+def main():
+    cases = {
+        "plain text": make_message(text="hello there"),
+        "last command": make_message(text="/set_language"),
+        "first command": make_message(text="/random_pack"),
+        "sticker": make_message(sticker=True),
+    }
+    bots = {"legacy": legacy_bot(), "router": router_bot()}
+    print(f"{'case':<15}{'legacy us':>12}{'router us':>12}{'speedup':>10}")
+    for case, message in cases.items():
+        results = {}
+        for name, bot in bots.items():
+            seconds = min(timeit.repeat(lambda: bot.process_new_messages([message]), number=NUMBER, repeat=3))
+            results[name] = seconds / NUMBER * 1e6
+        print(f"{case:<15}{results['legacy']:>12.2f}{results['router']:>12.2f}{results['legacy'] / results['router']:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -2,43 +2,72 @@ import telebot
 import os
 import random
 import time
+import signal
 import datetime
 from dotenv import load_dotenv
-from db_operations import init_db, get_pack_limit, get_reply_chance, set_reply_chance, count_packs, count_stickers, send_random_sticker, update_user
-from message_handlers import handle_sticker, random_pack, stats, set_reply_chance_command, get_reply_chance_command, ban_pack, unban_pack, list_packs, clear_packs, set_pack_limit, get_pack_limit_command, help_command, top_users, random_reply, set_language_command, handle_language_callback
+from db_operations import init_db, get_pack_limit, get_reply_chance, set_reply_chance, count_packs, count_stickers, send_random_sticker, update_user, rollup_events, start_rollup_thread
+from message_handlers import handle_sticker, random_pack, stats, set_reply_chance_command, get_reply_chance_command, ban_pack, unban_pack, list_packs, clear_packs, set_pack_limit, get_pack_limit_command, help_command, top_users, random_reply, set_language_command, handle_language_callback, slow_updates_command
 from translations import get_translation, set_user_language, get_user_language
+from snapshot import load_snapshot, save_snapshot, start_snapshot_thread
+from tracing import trace_update, instrument_bot, dump_slow_updates
+from router import Router
 
 load_dotenv()  # Load environment variables from .env
 TOKEN = os.getenv("TOKEN")
 bot = telebot.TeleBot(TOKEN)
 
+# Time Bot API calls made while handling updates
+instrument_bot(bot, ["get_sticker_set", "get_chat_member", "send_sticker", "send_message", "reply_to",
+                     "answer_callback_query", "delete_message"])
+
 # Store processed media groups to prevent duplicate replies
 processed_media_groups = {}  # media_group_id: timestamp
 
-# Initialize the database
+# Initialize the database, then warm in-memory caches from the last snapshot
 init_db()
+load_snapshot()
 
-# Register message handlers
-bot.message_handler(content_types=["sticker"])(lambda message: handle_sticker(bot, message))
-bot.message_handler(commands=["random_pack"])(lambda message: random_pack(bot, message))
-bot.message_handler(commands=["stats"])(lambda message: stats(bot, message))
-bot.message_handler(commands=["set_reply_chance"])(lambda message: set_reply_chance_command(bot, message))
-bot.message_handler(commands=["get_reply_chance"])(lambda message: get_reply_chance_command(bot, message))
-bot.message_handler(commands=["ban_pack"])(lambda message: ban_pack(bot, message))
-bot.message_handler(commands=["unban_pack"])(lambda message: unban_pack(bot, message))
-bot.message_handler(commands=["list_packs"])(lambda message: list_packs(bot, message))
-bot.message_handler(commands=["clear_packs"])(lambda message: clear_packs(bot, message))
-bot.message_handler(commands=["set_pack_limit"])(lambda message: set_pack_limit(bot, message))
-bot.message_handler(commands=["get_pack_limit"])(lambda message: get_pack_limit_command(bot, message))
-bot.message_handler(commands=["help"])(lambda message: help_command(bot, message))
-bot.message_handler(commands=["top_users"])(lambda message: top_users(bot, message))
-bot.message_handler(commands=["set_language"])(lambda message: set_language_command(bot, message))
-bot.callback_query_handler(func=lambda call: True)(lambda call: handle_language_callback(bot, call))
-bot.message_handler(content_types=["text", "photo", "video", "animation", "video_note"])(lambda message: random_reply(bot, message, processed_media_groups))
+# Route updates with one lookup by command, content type or callback data prefix
+router = Router()
+router.content_type(["sticker"], trace_update("handle_sticker", lambda message: handle_sticker(bot, message)))
+router.command("random_pack", trace_update("random_pack", lambda message: random_pack(bot, message)))
+router.command("stats", trace_update("stats", lambda message: stats(bot, message)))
+router.command("set_reply_chance", trace_update("set_reply_chance_command", lambda message: set_reply_chance_command(bot, message)))
+router.command("get_reply_chance", trace_update("get_reply_chance_command", lambda message: get_reply_chance_command(bot, message)))
+router.command("ban_pack", trace_update("ban_pack", lambda message: ban_pack(bot, message)))
+router.command("unban_pack", trace_update("unban_pack", lambda message: unban_pack(bot, message)))
+router.command("list_packs", trace_update("list_packs", lambda message: list_packs(bot, message)))
+router.command("clear_packs", trace_update("clear_packs", lambda message: clear_packs(bot, message)))
+router.command("set_pack_limit", trace_update("set_pack_limit", lambda message: set_pack_limit(bot, message)))
+router.command("get_pack_limit", trace_update("get_pack_limit_command", lambda message: get_pack_limit_command(bot, message)))
+router.command("help", trace_update("help_command", lambda message: help_command(bot, message)))
+router.command("top_users", trace_update("top_users", lambda message: top_users(bot, message)))
+router.command("slow_updates", trace_update("slow_updates_command", lambda message: slow_updates_command(bot, message)))
+router.command("set_language", trace_update("set_language_command", lambda message: set_language_command(bot, message)))
+language_callback = trace_update("handle_language_callback", lambda call: handle_language_callback(bot, call))
+router.callback("lang", language_callback)
+router.callback(None, language_callback)
+router.content_type(["text", "photo", "video", "animation", "video_note"], trace_update("random_reply", lambda message: random_reply(bot, message, processed_media_groups)))
+router.register(bot)
 
 def log(msg):
     """Log messages with timestamp."""
     print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {msg}")
 
+# Save a snapshot periodically and on shutdown for a warm restart
+start_snapshot_thread()
+# Write buffered activity events and refresh hourly/daily rollups
+start_rollup_thread(int(os.getenv("EVENT_ROLLUP_INTERVAL", "10")))
+signal.signal(signal.SIGTERM, lambda signum, frame: bot.stop_polling())
+
 log("Bot started...")
-bot.polling(none_stop=True)
\ No newline at end of file
+try:
+    bot.polling(none_stop=True)
+finally:
+    # Each shutdown step logs its own failure, so one cannot skip the others
+    try:
+        rollup_events()
+    except Exception as e:
+        log(f"Failed to roll up events on shutdown: {e}")
+    save_snapshot()
+    dump_slow_updates()
\ No newline at end of file
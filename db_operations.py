@@ -1,10 +1,49 @@
 import sqlite3
 import datetime
 import random
+import time
+import threading
 import telebot
+from tracing import traced
+
+DB_PATH = "packs.db"
 
 # Global database connection
-conn = sqlite3.connect("packs.db", check_same_thread=False)
+conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+
+# Separate connection for the event log, so other threads' `with conn:` blocks
+# can never commit or roll back a flush or rollup halfway through
+events_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+
+# In-memory caches in front of SQLite and the Bot API (persisted by snapshot.py)
+chat_settings_cache = {}  # chat_id: [pack_limit, reply_chance, language]
+pack_index = {}  # chat_id: {set_name: [status, sticker_count]}
+sticker_file_ids = {}  # set_name: [fetched_at, [file_id, ...]]
+
+# Bumped on every invalidation, so a fill that raced with a write is not stored
+cache_generations = {"chat_settings": 0, "pack_index": 0}
+# Held across each write to packs/chat_settings and its invalidation, and by snapshot.py
+# while it reads the data version and exports the caches, so the two always match
+cache_lock = threading.RLock()
+
+# Refetch a sticker set's file_ids after this many seconds
+STICKER_CACHE_TTL = 24 * 60 * 60
+
+# Activity event kinds stored in the events table
+EVENT_STICKER_SEEN = 1
+EVENT_REPLY_SENT = 2
+EVENT_PACK_ADDED = 3
+EVENT_PACK_BANNED = 4
+
+# Rollup bucket sizes in seconds (UTC-aligned)
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Events are buffered in memory and written in batches
+EVENT_BATCH_SIZE = 100
+event_buffer = []  # (ts, chat_id, kind, user_id, set_name)
+event_lock = threading.Lock()
+events_db_lock = threading.Lock()  # one transaction on events_conn at a time, or rollups count events twice
 
 def log(msg):
     """Log messages with timestamp."""
@@ -46,6 +85,54 @@ def init_db():
             media_calls INTEGER DEFAULT 0
         )
         """)
+        # Create append-only activity event log
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER,
+            chat_id INTEGER,
+            kind INTEGER,
+            user_id INTEGER,
+            set_name TEXT
+        )
+        """)
+        # Create per-chat event counts by hour and day
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS event_rollups (
+            bucket_seconds INTEGER,
+            bucket_start INTEGER,
+            chat_id INTEGER,
+            kind INTEGER,
+            count INTEGER DEFAULT 0,
+            PRIMARY KEY (bucket_seconds, chat_id, bucket_start, kind)
+        )
+        """)
+        # Create rollup progress table (last event id already rolled up)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER DEFAULT 0
+        )
+        """)
+        # Create version counter of the tables cached in memory (checked by snapshot.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER DEFAULT 0
+        )
+        """)
+        cur.execute("INSERT OR IGNORE INTO data_version (name, version) VALUES ('cache', 0)")
+        conn.commit()
+
+        # Bump the version in the same transaction as any change to packs or chat_settings
+        for table in ("packs", "chat_settings"):
+            for action in ("INSERT", "UPDATE", "DELETE"):
+                cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS bump_version_{table}_{action.lower()} AFTER {action} ON {table}
+                BEGIN
+                    UPDATE data_version SET version=version + 1 WHERE name='cache';
+                END
+                """)
         conn.commit()
 
         # Add indexes for faster queries
@@ -70,99 +157,175 @@ def init_db():
             conn.commit()
             log("Column language added to chat_settings")
 
-def get_pack_limit(chat_id):
-    """Get the pack limit for a chat."""
+@traced("db.get_chat_settings")
+def get_chat_settings(chat_id):
+    """Get [pack_limit, reply_chance, language] for a chat, creating defaults if missing."""
+    settings = chat_settings_cache.get(chat_id)
+    if settings is not None:
+        return settings
+    generation = cache_generations["chat_settings"]
     with conn:
         cur = conn.cursor()
-        cur.execute("SELECT pack_limit FROM chat_settings WHERE chat_id=?", (chat_id,))
+        cur.execute("SELECT pack_limit, reply_chance, language FROM chat_settings WHERE chat_id=?", (chat_id,))
         row = cur.fetchone()
         if row:
-            return row[0]
-        cur.execute("INSERT OR IGNORE INTO chat_settings (chat_id, pack_limit, reply_chance, language) VALUES (?, ?, ?, ?)",
-                    (chat_id, 50, 0.05, 'en'))
-        return 50
+            settings = list(row)
+        else:
+            cur.execute("INSERT OR IGNORE INTO chat_settings (chat_id, pack_limit, reply_chance, language) VALUES (?, ?, ?, ?)",
+                        (chat_id, 50, 0.05, 'en'))
+            settings = [50, 0.05, 'en']
+    with cache_lock:
+        if cache_generations["chat_settings"] == generation:
+            chat_settings_cache[chat_id] = settings
+    return settings
+
+def invalidate_chat_settings(chat_id):
+    """Drop cached settings for a chat after they were changed in the database."""
+    with cache_lock:
+        cache_generations["chat_settings"] += 1
+        chat_settings_cache.pop(chat_id, None)
+
+def get_pack_limit(chat_id):
+    """Get the pack limit for a chat."""
+    return get_chat_settings(chat_id)[0]
+
+@traced("db.set_pack_limit_value")
+def set_pack_limit_value(chat_id, limit):
+    """Set the pack limit for a chat."""
+    with cache_lock, conn:
+        cur = conn.cursor()
+        cur.execute("INSERT OR REPLACE INTO chat_settings (chat_id, pack_limit, reply_chance, language) "
+                    "VALUES (?, ?, COALESCE((SELECT reply_chance FROM chat_settings WHERE chat_id=?), 0.05), "
+                    "COALESCE((SELECT language FROM chat_settings WHERE chat_id=?), 'en'))",
+                    (chat_id, limit, chat_id, chat_id))
+        invalidate_chat_settings(chat_id)
 
 def get_reply_chance(chat_id):
     """Get the reply chance for a chat."""
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT reply_chance FROM chat_settings WHERE chat_id=?", (chat_id,))
-        row = cur.fetchone()
-        if row:
-            return row[0]
-        cur.execute("INSERT OR IGNORE INTO chat_settings (chat_id, pack_limit, reply_chance, language) VALUES (?, ?, ?, ?)",
-                    (chat_id, 50, 0.05, 'en'))
-        return 0.05
+    return get_chat_settings(chat_id)[1]
 
+@traced("db.set_reply_chance")
 def set_reply_chance(chat_id, chance):
     """Set the reply chance for a chat."""
-    with conn:
+    with cache_lock, conn:
         cur = conn.cursor()
         cur.execute("INSERT OR REPLACE INTO chat_settings (chat_id, pack_limit, reply_chance, language) "
                     "VALUES (?, COALESCE((SELECT pack_limit FROM chat_settings WHERE chat_id=?), 50), ?, "
                     "COALESCE((SELECT language FROM chat_settings WHERE chat_id=?), 'en'))",
                     (chat_id, chat_id, chance, chat_id))
+        invalidate_chat_settings(chat_id)
 
 def get_chat_language(chat_id):
     """Get the language for a chat."""
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT language FROM chat_settings WHERE chat_id=?", (chat_id,))
-        row = cur.fetchone()
-        if row:
-            return row[0]
-        cur.execute("INSERT OR IGNORE INTO chat_settings (chat_id, pack_limit, reply_chance, language) VALUES (?, ?, ?, ?)",
-                    (chat_id, 50, 0.05, 'en'))
-        return 'en'
+    return get_chat_settings(chat_id)[2]
 
+@traced("db.set_chat_language")
 def set_chat_language(chat_id, lang):
     """Set the language for a chat."""
-    with conn:
+    with cache_lock, conn:
         cur = conn.cursor()
         cur.execute("INSERT OR REPLACE INTO chat_settings (chat_id, pack_limit, reply_chance, language) "
                     "VALUES (?, COALESCE((SELECT pack_limit FROM chat_settings WHERE chat_id=?), 50), "
                     "COALESCE((SELECT reply_chance FROM chat_settings WHERE chat_id=?), 0.05), ?)",
                     (chat_id, chat_id, chat_id, lang))
+        invalidate_chat_settings(chat_id)
 
-def count_packs(chat_id):
-    """Count the number of allowed packs in a chat."""
+@traced("db.get_pack_index")
+def get_pack_index(chat_id):
+    """Get the known packs of a chat as {set_name: [status, sticker_count]}."""
+    index = pack_index.get(chat_id)
+    if index is not None:
+        return index
+    generation = cache_generations["pack_index"]
     with conn:
         cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM packs WHERE chat_id=? AND status='allowed'", (chat_id,))
-        row = cur.fetchone()
-        return row[0] if row else 0
+        cur.execute("SELECT set_name, status, sticker_count FROM packs WHERE chat_id=?", (chat_id,))
+        index = {set_name: [status, sticker_count] for set_name, status, sticker_count in cur.fetchall()}
+    with cache_lock:
+        if cache_generations["pack_index"] == generation:
+            pack_index[chat_id] = index
+    return index
+
+def invalidate_pack_index(chat_id):
+    """Drop the cached pack index for a chat after its packs were changed in the database."""
+    with cache_lock:
+        cache_generations["pack_index"] += 1
+        pack_index.pop(chat_id, None)
+
+@traced("db.add_pack")
+def add_pack(chat_id, set_name, sticker_count):
+    """Save a new pack for a chat; return False if it is already saved."""
+    with cache_lock:
+        try:
+            with conn:
+                cur = conn.cursor()
+                cur.execute("INSERT INTO packs (chat_id, set_name, sticker_count) VALUES (?, ?, ?)",
+                            (chat_id, set_name, sticker_count))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            invalidate_pack_index(chat_id)
+
+@traced("db.set_pack_status")
+def set_pack_status(chat_id, set_name, status):
+    """Set the status ('allowed' or 'banned') of a pack; return False if the chat has no such pack."""
+    with cache_lock, conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE packs SET status=? WHERE chat_id=? AND set_name=?", (status, chat_id, set_name))
+        invalidate_pack_index(chat_id)
+        return cur.rowcount > 0
+
+@traced("db.delete_packs")
+def delete_packs(chat_id):
+    """Delete all packs of a chat."""
+    with cache_lock, conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM packs WHERE chat_id=?", (chat_id,))
+        invalidate_pack_index(chat_id)
+
+@traced("cache.sticker_file_ids")
+def get_sticker_file_ids(bot, set_name):
+    """Get the file_ids of a sticker set, calling get_sticker_set only on a cache miss."""
+    entry = sticker_file_ids.get(set_name)
+    if entry and time.time() - entry[0] < STICKER_CACHE_TTL:
+        return entry[1]
+    sticker_set = bot.get_sticker_set(set_name)
+    file_ids = [sticker.file_id for sticker in sticker_set.stickers]
+    sticker_file_ids[set_name] = [time.time(), file_ids]
+    return file_ids
+
+def count_packs(chat_id):
+    """Count the number of allowed packs in a chat."""
+    return sum(1 for status, _ in get_pack_index(chat_id).values() if status == "allowed")
 
 def count_stickers(chat_id):
     """Count the total number of stickers in allowed packs for a chat."""
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT SUM(sticker_count) FROM packs WHERE chat_id=? AND status='allowed'", (chat_id,))
-        row = cur.fetchone()
-        return row[0] if row and row[0] else 0
+    return sum(sticker_count or 0 for status, sticker_count in get_pack_index(chat_id).values() if status == "allowed")
 
+@traced("db.send_random_sticker")
 def send_random_sticker(bot, chat_id, reply_to_message_id=None):
     """Send a random sticker from allowed packs."""
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT set_name FROM packs WHERE chat_id=? AND status='allowed' ORDER BY RANDOM() LIMIT 1",
-                    (chat_id,))
-        row = cur.fetchone()
+    allowed = [set_name for set_name, (status, _) in get_pack_index(chat_id).items() if status == "allowed"]
 
-    if not row:
+    if not allowed:
         log(f"chat_id={chat_id}: No saved packs for sending sticker")
         return False
-    pack_name = row[0]
+    pack_name = random.choice(allowed)
 
     try:
-        sticker_set = bot.get_sticker_set(pack_name)
-        sticker = random.choice(sticker_set.stickers)
-        bot.send_sticker(chat_id, sticker.file_id, reply_to_message_id=reply_to_message_id)
+        file_id = random.choice(get_sticker_file_ids(bot, pack_name))
+        bot.send_sticker(chat_id, file_id, reply_to_message_id=reply_to_message_id)
+        log_event(chat_id, EVENT_REPLY_SENT, set_name=pack_name)
         log(f"chat_id={chat_id}: Sent sticker from pack '{pack_name}'")
         return True
     except Exception as e:
+        # Cached file_ids may have gone stale; refetch the set next time
+        sticker_file_ids.pop(pack_name, None)
         log(f"chat_id={chat_id}: Error sending sticker from pack '{pack_name}': {e}")
         return False
 
+@traced("db.update_user")
 def update_user(user, is_media=False):
     """Save or update user information."""
     with conn:
@@ -186,4 +349,99 @@ def update_user(user, is_media=False):
             0 if is_media else 1,
             1 if is_media else 0
         ))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+
+@traced("db.get_data_version")
+def get_data_version():
+    """Get the version counter of the packs and chat_settings tables."""
+    with conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM data_version WHERE name='cache'")
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+def export_caches():
+    """Return the in-memory caches as plain dicts for snapshotting."""
+    return {
+        "chat_settings": chat_settings_cache,
+        "pack_index": pack_index,
+        "sticker_file_ids": sticker_file_ids,
+    }
+
+def restore_caches(state):
+    """Warm the in-memory caches from a snapshot produced by export_caches()."""
+    chat_settings_cache.update(state.get("chat_settings", {}))
+    pack_index.update(state.get("pack_index", {}))
+    sticker_file_ids.update(state.get("sticker_file_ids", {}))
+
+@traced("db.log_event")
+def log_event(chat_id, kind, user_id=None, set_name=None):
+    """Buffer an activity event, writing the batch once it is full."""
+    with event_lock:
+        event_buffer.append((int(time.time()), chat_id, kind, user_id, set_name))
+        full = len(event_buffer) >= EVENT_BATCH_SIZE
+    if full:
+        flush_events()
+
+@traced("db.flush_events")
+def flush_events():
+    """Write buffered events to the events table."""
+    with event_lock:
+        batch = event_buffer[:]
+        event_buffer.clear()
+    if not batch:
+        return 0
+    with events_db_lock, events_conn:
+        cur = events_conn.cursor()
+        cur.executemany("INSERT INTO events (ts, chat_id, kind, user_id, set_name) VALUES (?, ?, ?, ?, ?)", batch)
+    return len(batch)
+
+@traced("db.rollup_events")
+def rollup_events():
+    """Flush buffered events and add events not yet rolled up to the hourly and daily counts."""
+    flush_events()
+    with events_db_lock, events_conn:
+        cur = events_conn.cursor()
+        cur.execute("SELECT last_event_id FROM rollup_state WHERE name='events'")
+        row = cur.fetchone()
+        last_id = row[0] if row else 0
+        cur.execute("SELECT MAX(id) FROM events")
+        max_id = cur.fetchone()[0] or 0
+        if max_id <= last_id:
+            return 0
+        for bucket in (HOUR, DAY):
+            cur.execute("""
+            INSERT INTO event_rollups (bucket_seconds, bucket_start, chat_id, kind, count)
+            SELECT ?, ts - ts % ?, chat_id, kind, COUNT(*) FROM events
+            WHERE id > ? AND id <= ?
+            GROUP BY ts - ts % ?, chat_id, kind
+            ON CONFLICT(bucket_seconds, chat_id, bucket_start, kind) DO UPDATE SET count=count + excluded.count
+            """, (bucket, bucket, last_id, max_id, bucket))
+        cur.execute("INSERT OR REPLACE INTO rollup_state (name, last_event_id) VALUES ('events', ?)", (max_id,))
+    return max_id - last_id
+
+def get_event_counts(chat_id, seconds, bucket_seconds=HOUR):
+    """Count events by kind in a chat from the buckets starting within the last `seconds`."""
+    # Round up so the counted buckets never reach further back than the window
+    since = int(time.time()) - seconds
+    since += -since % bucket_seconds
+    with events_db_lock, events_conn:
+        cur = events_conn.cursor()
+        cur.execute("SELECT kind, SUM(count) FROM event_rollups "
+                    "WHERE bucket_seconds=? AND chat_id=? AND bucket_start>=? GROUP BY kind",
+                    (bucket_seconds, chat_id, since))
+        return dict(cur.fetchall())
+
+def start_rollup_thread(interval):
+    """Start a daemon thread that flushes and rolls up events every `interval` seconds."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                rollup_events()
+            except Exception as e:
+                log(f"Failed to roll up events: {e}")
+
+    thread = threading.Thread(target=run, name="rollup", daemon=True)
+    thread.start()
+    return thread
\ No newline at end of file
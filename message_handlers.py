@@ -2,9 +2,9 @@ import telebot
 import random
 import time
 import datetime
-import sqlite3
-from db_operations import get_pack_limit, count_packs, count_stickers, send_random_sticker, update_user, get_reply_chance, set_reply_chance, conn, get_chat_language, set_chat_language
+from db_operations import get_pack_limit, count_packs, count_stickers, send_random_sticker, update_user, get_reply_chance, set_reply_chance, conn, get_chat_language, set_chat_language, get_pack_index, add_pack, set_pack_status, delete_packs, get_sticker_file_ids, set_pack_limit_value, log_event, get_event_counts, EVENT_STICKER_SEEN, EVENT_REPLY_SENT, EVENT_PACK_ADDED, EVENT_PACK_BANNED, DAY
 from translations import get_translation, get_user_language
+from tracing import span, get_slow_updates, format_trace
 
 def log(msg):
     """Log messages with timestamp."""
@@ -28,15 +28,15 @@ def handle_sticker(bot, message):
     if not pack_name:
         log(f"chat_id={chat_id}: Sticker without set_name, ignored")
         return
+    log_event(chat_id, EVENT_STICKER_SEEN, message.from_user.id, pack_name)
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT status FROM packs WHERE chat_id=? AND set_name=?", (chat_id, pack_name))
-        row = cur.fetchone()
-
-    if row and row[0] == "banned":
+    known = get_pack_index(chat_id).get(pack_name)
+    if known and known[0] == "banned":
         log(f"chat_id={chat_id}: Pack '{pack_name}' is banned, ignored")
         return
+    if known:
+        log(f"chat_id={chat_id}: Pack '{pack_name}' already in database, skipped")
+        return
 
     limit = get_pack_limit(chat_id)
     current_count = count_packs(chat_id)
@@ -45,19 +45,15 @@ def handle_sticker(bot, message):
         return
 
     try:
-        sticker_set = bot.get_sticker_set(pack_name)
-        sticker_count = len(sticker_set.stickers)
+        sticker_count = len(get_sticker_file_ids(bot, pack_name))
     except Exception as e:
         log(f"chat_id={chat_id}: Failed to get sticker count for '{pack_name}': {e}")
         sticker_count = 0
 
-    try:
-        with conn:
-            cur = conn.cursor()
-            cur.execute("INSERT INTO packs (chat_id, set_name, sticker_count) VALUES (?, ?, ?)",
-                        (chat_id, pack_name, sticker_count))
+    if add_pack(chat_id, pack_name, sticker_count):
+        log_event(chat_id, EVENT_PACK_ADDED, message.from_user.id, pack_name)
         log(f"chat_id={chat_id}: Added new pack '{pack_name}' ({sticker_count} stickers)")
-    except sqlite3.IntegrityError:
+    else:
         log(f"chat_id={chat_id}: Pack '{pack_name}' already in database, skipped")
 
 def random_pack(bot, message):
@@ -76,7 +72,19 @@ def stats(bot, message):
     count = count_packs(chat_id)
     stickers_total = count_stickers(chat_id)
     log(f"chat_id={chat_id}: Requested statistics (/stats)")
-    bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "stats").format(count=count, stickers_total=stickers_total, limit=limit))
+    lang = get_user_language(user_id, chat_id)
+    text = get_translation(lang, "stats").format(count=count, stickers_total=stickers_total, limit=limit) + "\n"
+
+    # Time windows are served from the rollups, refreshed by the rollup thread
+    for window, seconds in (("last_24h", DAY), ("last_7d", 7 * DAY)):
+        counts = get_event_counts(chat_id, seconds)
+        text += "\n" + get_translation(lang, "stats_window").format(
+            window=get_translation(lang, window),
+            stickers_seen=counts.get(EVENT_STICKER_SEEN, 0),
+            replies_sent=counts.get(EVENT_REPLY_SENT, 0),
+            packs_added=counts.get(EVENT_PACK_ADDED, 0),
+            packs_banned=counts.get(EVENT_PACK_BANNED, 0))
+    bot.reply_to(message, text)
 
 def set_reply_chance_command(bot, message):
     """Handle /set_reply_chance command to set sticker reply chance."""
@@ -126,15 +134,13 @@ def ban_pack(bot, message):
         return
     pack_name = args[1]
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("UPDATE packs SET status='banned' WHERE chat_id=? AND set_name=?", (chat_id, pack_name))
-        if cur.rowcount == 0:
-            bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_not_found").format(pack_name=pack_name))
-            log(f"chat_id={chat_id}: Attempt to ban non-existent pack '{pack_name}'")
-        else:
-            bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_banned").format(pack_name=pack_name))
-            log(f"chat_id={chat_id}: Pack '{pack_name}' banned")
+    if not set_pack_status(chat_id, pack_name, "banned"):
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_not_found").format(pack_name=pack_name))
+        log(f"chat_id={chat_id}: Attempt to ban non-existent pack '{pack_name}'")
+    else:
+        log_event(chat_id, EVENT_PACK_BANNED, user_id, pack_name)
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_banned").format(pack_name=pack_name))
+        log(f"chat_id={chat_id}: Pack '{pack_name}' banned")
 
 def unban_pack(bot, message):
     """Handle /unban_pack command to unban a sticker pack."""
@@ -151,21 +157,18 @@ def unban_pack(bot, message):
         return
     pack_name = args[1]
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("UPDATE packs SET status='allowed' WHERE chat_id=? AND set_name=?", (chat_id, pack_name))
-        if cur.rowcount == 0:
-            bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_not_found").format(pack_name=pack_name))
-            log(f"chat_id={chat_id}: Attempt to unban non-existent pack '{pack_name}'")
-        else:
-            bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_unbanned").format(pack_name=pack_name))
-            log(f"chat_id={chat_id}: Pack '{pack_name}' unbanned")
+    if not set_pack_status(chat_id, pack_name, "allowed"):
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_not_found").format(pack_name=pack_name))
+        log(f"chat_id={chat_id}: Attempt to unban non-existent pack '{pack_name}'")
+    else:
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_unbanned").format(pack_name=pack_name))
+        log(f"chat_id={chat_id}: Pack '{pack_name}' unbanned")
 
 def list_packs(bot, message):
     """Handle /list_packs command to list all packs."""
     chat_id = message.chat.id
     user_id = message.from_user.id
-    with conn:
+    with span("db.list_packs"), conn:
         cur = conn.cursor()
         cur.execute("SELECT set_name, status FROM packs WHERE chat_id=?", (chat_id,))
         rows = cur.fetchall()
@@ -191,9 +194,7 @@ def clear_packs(bot, message):
         log(f"chat_id={chat_id}, user_id={user_id}: Non-admin attempted to clear packs")
         return
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM packs WHERE chat_id=?", (chat_id,))
+    delete_packs(chat_id)
     bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "packs_cleared"))
     log(f"chat_id={chat_id}: Cleared pack database")
 
@@ -218,12 +219,7 @@ def set_pack_limit(bot, message):
         bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "invalid_limit"))
         return
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO chat_settings (chat_id, pack_limit, reply_chance, language) "
-                    "VALUES (?, ?, COALESCE((SELECT reply_chance FROM chat_settings WHERE chat_id=?), 0.05), "
-                    "COALESCE((SELECT language FROM chat_settings WHERE chat_id=?), 'en'))",
-                    (chat_id, new_limit, chat_id, chat_id))
+    set_pack_limit_value(chat_id, new_limit)
     bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "pack_limit_set").format(limit=new_limit))
     log(f"chat_id={chat_id}: Pack limit set to {new_limit}")
 
@@ -246,7 +242,7 @@ def top_users(bot, message):
     """Handle /top_users command to show top users by activity."""
     chat_id = message.chat.id
     user_id = message.from_user.id
-    with conn:
+    with span("db.top_users"), conn:
         cur = conn.cursor()
         cur.execute("""
         SELECT username, first_name, sticker_calls, media_calls 
@@ -264,6 +260,36 @@ def top_users(bot, message):
         text += f"{i}. {name} — 🎯 {stickers} {get_translation(get_user_language(user_id, chat_id), 'stickers_label')}, 📷 {media} {get_translation(get_user_language(user_id, chat_id), 'media_label')}\n"
     bot.reply_to(message, text)
 
+def slow_updates_command(bot, message):
+    """Handle /slow_updates command to show recent slow updates in this chat."""
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+    if message.chat.type != "private" and not is_admin(bot, chat_id, user_id):
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "admin_only"))
+        log(f"chat_id={chat_id}, user_id={user_id}: Non-admin attempted to view slow updates")
+        return
+
+    traces = get_slow_updates(chat_id)[-5:]
+    if not traces:
+        bot.reply_to(message, get_translation(get_user_language(user_id, chat_id), "no_slow_updates"))
+        return
+
+    # Keep the newest traces that fit into one Telegram message
+    header = get_translation(get_user_language(user_id, chat_id), "slow_updates") + "\n"
+    body = ""
+    shown = 0
+    for trace in reversed(traces):
+        chunk = format_trace(trace)
+        if len(header) + len(chunk) + len(body) > telebot.util.MAX_MESSAGE_LENGTH:
+            if not body:
+                body = chunk[:telebot.util.MAX_MESSAGE_LENGTH - len(header)]
+                shown = 1
+            break
+        body = chunk + body
+        shown += 1
+    bot.reply_to(message, header + body)
+    log(f"chat_id={chat_id}: Sent slow updates (count: {shown})")
+
 def set_language_command(bot, message):
     """Handle /set_language command to show language selection buttons."""
     chat_id = message.chat.id
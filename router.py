@@ -0,0 +1,50 @@
+from telebot import util
+
+class Router:
+    """Dispatch updates to handlers with one dict lookup instead of testing every handler's filters."""
+
+    def __init__(self):
+        self.commands = {}  # command name: handler
+        self.content_types = {}  # content_type: handler
+        self.callbacks = {}  # callback data prefix: handler
+        self.default_callback = None
+
+    def command(self, name, handler):
+        """Route a text command (without the leading '/') to a handler."""
+        self.commands[name] = handler
+
+    def content_type(self, content_types, handler):
+        """Route messages of the given content types to a handler."""
+        for content_type in content_types:
+            self.content_types[content_type] = handler
+
+    def callback(self, prefix, handler):
+        """Route callback queries whose data starts with 'prefix:' to a handler; prefix None is the fallback."""
+        if prefix is None:
+            self.default_callback = handler
+        else:
+            self.callbacks[prefix] = handler
+
+    def dispatch_message(self, message):
+        """Call the handler for a message: its command first, then its content type."""
+        if message.content_type == "text" and message.text.startswith("/"):
+            handler = self.commands.get(util.extract_command(message.text))
+            if handler:
+                return handler(message)
+        handler = self.content_types.get(message.content_type)
+        if handler:
+            return handler(message)
+
+    def dispatch_callback(self, call):
+        """Call the handler for a callback query by the prefix of its data."""
+        prefix = (call.data or "").split(":", 1)[0]
+        handler = self.callbacks.get(prefix, self.default_callback)
+        if handler:
+            return handler(call)
+
+    def register(self, bot):
+        """Register the router as the bot's only message and callback query handlers."""
+        # Commands arrive as text, so "text" must be accepted even without a text route
+        content_types = list(set(self.content_types) | {"text"})
+        bot.message_handler(content_types=content_types)(self.dispatch_message)
+        bot.callback_query_handler(func=lambda call: True)(self.dispatch_callback)
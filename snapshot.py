@@ -0,0 +1,97 @@
+import os
+import time
+import struct
+import marshal
+import datetime
+import threading
+from db_operations import export_caches, restore_caches, get_data_version, cache_lock
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "state.snapshot")
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "300"))  # seconds between periodic snapshots
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "86400"))  # ignore snapshots older than this
+
+# File layout: fixed header followed by a marshal-encoded dict of caches
+SNAPSHOT_MAGIC = b"RSBS"
+SNAPSHOT_VERSION = 2
+HEADER = struct.Struct("<4sHHdq")  # magic, format version, marshal version, created_at, data version
+
+# Sections derived from packs.db; only trusted if packs and chat_settings are unchanged since the snapshot
+DB_SECTIONS = ("chat_settings", "pack_index")
+
+_lock = threading.Lock()
+
+def log(msg):
+    """Log messages with timestamp."""
+    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {msg}")
+
+def save_snapshot(path=SNAPSHOT_PATH):
+    """Write the in-memory caches to a binary snapshot file."""
+    with _lock:
+        try:
+            # Writes change the version and invalidate the cache under cache_lock,
+            # so holding it here keeps the saved version and caches consistent
+            with cache_lock:
+                data_version = get_data_version()
+                body = marshal.dumps(export_caches())
+            header = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, marshal.version, time.time(), data_version)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.write(body)
+            os.replace(tmp_path, path)
+            log(f"Snapshot saved to '{path}' ({len(body) + HEADER.size} bytes)")
+            return True
+        except Exception as e:
+            log(f"Failed to save snapshot to '{path}': {e}")
+            return False
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Warm the in-memory caches from a snapshot file if it is valid and fresh."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        log(f"No snapshot at '{path}', starting cold")
+        return False
+    except OSError as e:
+        log(f"Failed to read snapshot '{path}': {e}")
+        return False
+
+    if len(data) < HEADER.size:
+        log(f"Snapshot '{path}' is truncated, ignored")
+        return False
+    magic, version, marshal_version, created_at, data_version = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or marshal_version != marshal.version:
+        log(f"Snapshot '{path}' has an incompatible format, ignored")
+        return False
+    age = time.time() - created_at
+    if age > SNAPSHOT_MAX_AGE:
+        log(f"Snapshot '{path}' is stale ({age:.0f}s old), ignored")
+        return False
+
+    try:
+        state = marshal.loads(data[HEADER.size:])
+    except (EOFError, ValueError, TypeError) as e:
+        log(f"Snapshot '{path}' is corrupt, ignored: {e}")
+        return False
+
+    if data_version != get_data_version():
+        # Packs or chat settings changed after the snapshot; keep only the Bot API data
+        for section in DB_SECTIONS:
+            state.pop(section, None)
+        log("Packs or chat settings changed since snapshot, restoring sticker file_ids only")
+
+    restore_caches(state)
+    log(f"Snapshot restored from '{path}' ({age:.0f}s old)")
+    return True
+
+def start_snapshot_thread(interval=SNAPSHOT_INTERVAL, path=SNAPSHOT_PATH):
+    """Start a daemon thread that saves a snapshot every `interval` seconds."""
+    def run():
+        while True:
+            time.sleep(interval)
+            save_snapshot(path)
+
+    thread = threading.Thread(target=run, name="snapshot", daemon=True)
+    thread.start()
+    return thread
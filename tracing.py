@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import random
+import datetime
+import functools
+import threading
+import collections
+
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))  # record updates slower than this
+# Share of updates that collect a per-step breakdown; unsampled slow updates are recorded
+# with their total time only. Set TRACE_SAMPLE_RATE=1 while debugging to trace every update.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))  # slow updates kept in memory
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH")  # JSON file written on shutdown, if set
+
+# Ring buffer of recent slow updates
+slow_updates = collections.deque(maxlen=TRACE_BUFFER_SIZE)
+
+# Spans of the update being handled by the current worker thread
+_local = threading.local()
+
+def log(msg):
+    """Log messages with timestamp."""
+    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {msg}")
+
+class _Span:
+    """Time a block and append it to the active trace."""
+    __slots__ = ("name", "spans", "depth", "start")
+
+    def __init__(self, name, spans):
+        self.name = name
+        self.spans = spans
+
+    def __enter__(self):
+        self.depth = _local.depth
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.spans.append((self.name, self.depth, self.start, time.perf_counter() - self.start))
+        _local.depth = self.depth
+        return False
+
+class _NoopSpan:
+    """Stand-in used when no sampled update is being traced."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name):
+    """Open a child span of the current update, or a no-op if it is not sampled."""
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        return _NOOP_SPAN
+    return _Span(name, spans)
+
+def traced(name):
+    """Decorator wrapping every call of a function in a child span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_bot(bot, methods):
+    """Wrap the given Bot API methods of a bot instance in child spans."""
+    for method in methods:
+        setattr(bot, method, traced(f"api.{method}")(getattr(bot, method)))
+
+def _chat_id(update):
+    """Get the chat id of a message or callback query."""
+    message = getattr(update, "message", None) or update
+    chat = getattr(message, "chat", None)
+    return chat.id if chat else None
+
+def trace_update(name, handler):
+    """Wrap an update handler in a root span and record it if it is slow."""
+    def wrapper(update):
+        spans = [] if random.random() < TRACE_SAMPLE_RATE else None
+        _local.spans = spans
+        _local.depth = 0
+        start = time.perf_counter()
+        try:
+            return handler(update)
+        finally:
+            duration = time.perf_counter() - start
+            _local.spans = None
+            if duration * 1000 >= TRACE_SLOW_MS:
+                _record(name, update, start, duration, spans)
+    return wrapper
+
+def _record(name, update, start, duration, spans):
+    """Append a slow update to the ring buffer."""
+    trace = {
+        "handler": name,
+        "chat_id": _chat_id(update),
+        "time": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "duration_ms": round(duration * 1000, 1),
+        "spans": None,
+    }
+    if spans is not None:
+        trace["spans"] = [
+            {
+                "name": span_name,
+                "depth": depth,
+                "offset_ms": round((span_start - start) * 1000, 1),
+                "duration_ms": round(span_duration * 1000, 1),
+            }
+            for span_name, depth, span_start, span_duration in sorted(spans, key=lambda s: s[2])
+        ]
+    slow_updates.append(trace)
+    log(f"chat_id={trace['chat_id']}: Slow update in {name} ({trace['duration_ms']} ms)")
+
+def get_slow_updates(chat_id=None):
+    """Get recorded slow updates, oldest first, optionally only for one chat."""
+    traces = list(slow_updates)
+    if chat_id is None:
+        return traces
+    return [trace for trace in traces if trace["chat_id"] == chat_id]
+
+def format_trace(trace):
+    """Format a slow update as text, merging repeated spans into one line with a count."""
+    merged = {}  # (name, depth): [first offset_ms, total duration_ms, count]
+    for s in trace["spans"] or []:
+        entry = merged.setdefault((s["name"], s["depth"]), [s["offset_ms"], 0, 0])
+        entry[1] += s["duration_ms"]
+        entry[2] += 1
+
+    text = f"{trace['time']} {trace['handler']} — {trace['duration_ms']} ms\n"
+    for (name, depth), (offset_ms, duration_ms, count) in merged.items():
+        repeats = f" ×{count}" if count > 1 else ""
+        text += f"{'  ' * (depth + 1)}{name}{repeats} +{offset_ms} ms: {round(duration_ms, 1)} ms\n"
+    return text
+
+def dump_slow_updates(path=TRACE_DUMP_PATH):
+    """Write all recorded slow updates to a JSON file."""
+    if not path:
+        return False
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(get_slow_updates(), f, ensure_ascii=False, indent=2)
+        log(f"Dumped {len(slow_updates)} slow updates to '{path}'")
+        return True
+    except Exception as e:
+        log(f"Failed to dump slow updates to '{path}': {e}")
+        return False
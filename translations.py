@@ -34,6 +34,7 @@ TRANSLATIONS = {
             "/set_reply_chance <число> — установить шанс ответа стикером (%) (только для админов)\n"
             "/get_reply_chance — узнать текущий шанс ответа стикером\n"
             "/set_language — выбрать язык чата через кнопки\n"
+            "/slow_updates — последние медленные обновления в чате (только для админов)\n"
             "/help — показать это сообщение"
         ),
         "no_users": "Пока нет данных по пользователям.",
@@ -48,6 +49,11 @@ TRANSLATIONS = {
         "unsupported_language": "Ошибка: неподдерживаемый язык.",
         "stickers_label": "стикеры",
         "media_label": "медиа",
+        "no_slow_updates": "Медленных обновлений в этом чате не было.",
+        "stats_window": "{window}: 🎯 стикеров {stickers_seen}, 💬 ответов {replies_sent}, ➕ паков добавлено {packs_added}, 🚫 забанено {packs_banned}",
+        "last_24h": "За 24 часа",
+        "last_7d": "За 7 дней",
+        "slow_updates": "🐢 Медленные обновления:",
         "admin_only": "Только администраторы могут выполнять эту команду."
     },
     "uk": {
@@ -82,6 +88,7 @@ TRANSLATIONS = {
             "/set_reply_chance <число> — встановити шанс відповіді стікером (%) (тільки для адмінів)\n"
             "/get_reply_chance — дізнатися поточний шанс відповіді стікером\n"
             "/set_language — обрати мову чату через кнопки\n"
+            "/slow_updates — останні повільні оновлення в чаті (тільки для адмінів)\n"
             "/help — показати це повідомлення"
         ),
         "no_users": "Поки немає даних про користувачів.",
@@ -96,6 +103,11 @@ TRANSLATIONS = {
         "unsupported_language": "Помилка: непідтримувана мова.",
         "stickers_label": "стікері",
         "media_label": "медіа",
+        "no_slow_updates": "Повільних оновлень у цьому чаті не було.",
+        "stats_window": "{window}: 🎯 стікерів {stickers_seen}, 💬 відповідей {replies_sent}, ➕ паків додано {packs_added}, 🚫 заблоковано {packs_banned}",
+        "last_24h": "За 24 години",
+        "last_7d": "За 7 днів",
+        "slow_updates": "🐢 Повільні оновлення:",
         "admin_only": "Тільки адміністратори можуть виконувати цю команду."
     },
     "en": {
@@ -130,6 +142,7 @@ TRANSLATIONS = {
             "/set_reply_chance <number> — set the sticker reply chance (%) (admin only)\n"
             "/get_reply_chance — check the current sticker reply chance\n"
             "/set_language — select the chat's language via buttons\n"
+            "/slow_updates — show recent slow updates in this chat (admin only)\n"
             "/help — show this message"
         ),
         "no_users": "No user data available yet.",
@@ -144,6 +157,11 @@ TRANSLATIONS = {
         "unsupported_language": "Error: unsupported language.",
         "stickers_label": "stickers",
         "media_label": "media",
+        "no_slow_updates": "No slow updates recorded in this chat.",
+        "stats_window": "{window}: 🎯 {stickers_seen} stickers, 💬 {replies_sent} replies, ➕ {packs_added} packs added, 🚫 {packs_banned} banned",
+        "last_24h": "Last 24h",
+        "last_7d": "Last 7 days",
+        "slow_updates": "🐢 Slow updates:",
         "admin_only": "Only administrators can execute this command."
     }
 }